@@ -1,6 +1,33 @@
 GPT_MODEL = "gpt-4o"
 EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_BATCH_TOKENS = 250_000
 NUM_OF_CONTEXT_CHUNKS = 5
 
+ANSWER_CACHE_SIZE = 1024
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.97
+ANSWER_CACHE_TTL_SECONDS = 60 * 60
+
+RETRIEVAL_CACHE_SIZE = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 60 * 60
+
+QUERY_EMBEDDING_BATCH_SIZE = 32
+QUERY_EMBEDDING_BATCH_WAIT_SECONDS = 0.005
+
+LOCAL_INDEX_HNSW_M = 32
+LOCAL_INDEX_EF_SEARCH = 64
+
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+
+MONGO_MAX_POOL_SIZE = 100
+MONGO_MIN_POOL_SIZE = 10
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 2000
+MONGO_COMPRESSORS = "zstd,zlib"
+
+INGESTION_CONCURRENCY = 8
+VESPA_FEED_CONNECTIONS = 32
+OPENAI_MAX_CONNECTIONS = 64
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 32
+
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
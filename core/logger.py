@@ -1,46 +1,60 @@
 import os
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-from core.settings import ROOT_DIR
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from typing import Optional
+from core.settings import ROOT_DIR, LOG_LEVEL
 
+_listener: Optional[QueueListener] = None
 
-def get_logger(name: str, log_file: str = "app.log", level: int = logging.INFO) -> logging.Logger:
+
+def configure_logging(log_file: str = "app.log", level: str = LOG_LEVEL) -> None:
     """
-    Creates and returns a logger instance with the given name, log file, and log level.
+    Configures the root logger once per process. Log records are put on a queue and written to the console and to
+    a rotating log file by a background thread, so logging calls never wait on file I/O.
 
-    Args:
-        name (str): Name of the logger, usually `__name__`.
-        log_file (str): Name of the log file (default: app.log).
-        level (int): Logging level (e.g., logging.INFO, logging.DEBUG). Default is `logging.INFO`.
+    Should be called at application startup. Calling it again has no effect.
 
-    Returns:
-        logging.Logger: Configured logger instance.
+    Args:
+        log_file (str): Name of the log file inside the logs directory (default: app.log).
+        level (str): Logging level name (e.g., "INFO", "DEBUG"). Default is the `LOG_LEVEL` setting.
     """
+    global _listener
+    if _listener is not None:
+        return
+
     LOGS_DIR = os.path.join(ROOT_DIR, "logs")
     log_file_path = os.path.join(LOGS_DIR, log_file)
 
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-
-    # Check if logger already has handlers to avoid duplicate logs
-    if not logger.hasHandlers():
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(level)
-        console_formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-        console_handler.setFormatter(console_formatter)
-
-        file_handler = RotatingFileHandler(
-            log_file_path, maxBytes=5 * 1024 * 1024, backupCount=3
-        )
-        file_handler.setLevel(level)
-        file_formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-        file_handler.setFormatter(file_formatter)
-
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
-
-    return logger
\ No newline at end of file
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    file_handler = RotatingFileHandler(
+        log_file_path, maxBytes=5 * 1024 * 1024, backupCount=3
+    )
+    file_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(QueueHandler(log_queue))
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns the logger with the given name. Handlers are attached to the root logger by `configure_logging`.
+
+    Args:
+        name (str): Name of the logger, usually `__name__`.
+
+    Returns:
+        logging.Logger: Logger instance.
+    """
+    return logging.getLogger(name)
@@ -14,3 +14,7 @@ ALLOW_ORIGINS = os.environ.get("ALLOW_ORIGINS")
 
 VESPA_HOST = os.environ.get("VESPA_HOST")
 VESPA_PORT = os.environ.get("VESPA_PORT")
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(ROOT_DIR, "cache", "embeddings.sqlite3"))
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", os.path.join(ROOT_DIR, "cache", "answers.pkl"))
+LOCAL_INDEX_PATH = os.environ.get("LOCAL_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "chunks.faiss"))
@@ -2,7 +2,7 @@ import os
 from core.settings import ROOT_DIR
 from core.logger import get_logger
 
-logger = get_logger(__name__, log_file="utils.log")
+logger = get_logger(__name__)
 
 def delete_temporary_files():
     """
@@ -14,16 +14,15 @@ def delete_temporary_files():
             logger.warning(f"Data directory {data_dir} does not exist")
             return
 
-        deleted_files = []
-        for file in os.listdir(data_dir):
-            if file.endswith((".txt", ".pdf")):
-                file_path = os.path.join(data_dir, file)
-                os.remove(file_path)
-                deleted_files.append(file_path)
-                logger.info(f"Deleted temporary file: {file_path}")
+        deleted_count = 0
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith((".txt", ".pdf")):
+                    os.unlink(entry.path)
+                    deleted_count += 1
         
-        if deleted_files:
-            logger.info(f"Successfully deleted {len(deleted_files)} temporary files")
+        if deleted_count:
+            logger.info(f"Successfully deleted {deleted_count} temporary files")
         else:
             logger.info("No temporary files found to delete")
             
@@ -1,10 +1,67 @@
 import os
-from typing import Optional
-from PyPDF2 import PdfReader
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, List, Optional
+import pypdfium2 as pdfium
 from core.logger import get_logger
 from core.settings import ROOT_DIR
 
-logger = get_logger(__name__, log_file="ingestion.log")
+logger = get_logger(__name__)
+
+# Minimum number of PDF pages extracted by each worker process
+PARALLEL_PDF_MIN_PAGES = 16
+
+# PDFium is not thread-safe and files are processed on worker threads, so every PDFium call runs in a worker process.
+# Workers are spawned rather than forked, which would copy the locks held by other threads of the API process.
+PDF_PROCESS_CONTEXT = multiprocessing.get_context("spawn")
+
+# Size of the blocks in which uploaded files are copied to disk
+UPLOAD_COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def count_pdf_pages(filepath: str) -> int:
+    """
+    Count the pages of a PDF file, in a worker process.
+    
+    Args:
+        filepath: Path to the PDF file
+        
+    Returns:
+        int: Number of pages
+    """
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def extract_pdf_page_range(filepath: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF file, in a worker process with its own handle to the document.
+    
+    Args:
+        filepath: Path to the PDF file
+        start: Index of the first page to extract
+        stop: Index after the last page to extract
+        
+    Returns:
+        List[str]: Text of each page in the range
+    """
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        pages_text = []
+        for i in range(start, stop):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            pages_text.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return pages_text
+    finally:
+        pdf.close()
+
 
 class FileIngestion:
     def __init__(self):
@@ -12,12 +69,12 @@ class FileIngestion:
         self.data_dir = os.path.join(ROOT_DIR, "data")
         os.makedirs(self.data_dir, exist_ok=True)
     
-    def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
+    def save_uploaded_file(self, file: BinaryIO, filename: str) -> str:
         """
-        Save an uploaded file to the data directory.
+        Save an uploaded file to the data directory, copying it in blocks so it is never fully held in memory.
         
         Args:
-            file_content: The content of the uploaded file
+            file: Binary file object with the content of the uploaded file
             filename: Original filename
             
         Returns:
@@ -30,7 +87,7 @@ class FileIngestion:
             
             # Save the file
             with open(filepath, 'wb') as f:
-                f.write(file_content)
+                shutil.copyfileobj(file, f, UPLOAD_COPY_BLOCK_SIZE)
             
             logger.info(f"Successfully saved uploaded file to {filepath}")
             return filepath
@@ -52,20 +109,27 @@ class FileIngestion:
         try:
             logger.info(f"Extracting text from PDF: {filepath}")
             
-            with open(filepath, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                text = ""
+            # Spawned workers are started on demand, so small PDFs only start a single one
+            with ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=PDF_PROCESS_CONTEXT) as executor:
+                num_pages = executor.submit(count_pdf_pages, filepath).result()
+                
+                # Extract contiguous page ranges in parallel, one range per worker process
+                num_workers = max(1, min(os.cpu_count() or 1, num_pages // PARALLEL_PDF_MIN_PAGES))
+                bounds = [num_pages * i // num_workers for i in range(num_workers + 1)]
                 
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                ranges = executor.map(extract_pdf_page_range, [filepath] * num_workers, bounds[:-1], bounds[1:])
+                pages_text = [page_text for page_range in ranges for page_text in page_range]
+            
+            # Skip pages without text (e.g. scanned images) so they do not leave empty lines behind
+            text = "\n".join(page_text for page_text in pages_text if page_text).strip()
+            
+            if text:
+                logger.info(f"Successfully extracted text from PDF: {filepath}")
+                return text
+            else:
+                logger.warning(f"No text content found in PDF: {filepath}")
+                return None
                 
-                if text.strip():
-                    logger.info(f"Successfully extracted text from PDF: {filepath}")
-                    return text.strip()
-                else:
-                    logger.warning(f"No text content found in PDF: {filepath}")
-                    return None
-                    
         except Exception as e:
             logger.error(f"Error extracting text from PDF {filepath}: {str(e)}")
             return None
@@ -97,26 +161,28 @@ class FileIngestion:
             logger.error(f"Error extracting text from TXT file {filepath}: {str(e)}")
             return None
     
-    def process_file(self, file_content: bytes, filename: str) -> Optional[str]:
+    def process_file(self, file: BinaryIO, filename: str) -> Optional[str]:
         """
         Process an uploaded file and extract its text content.
         
         Args:
-            file_content: The content of the uploaded file
+            file: Binary file object with the content of the uploaded file
             filename: Original filename
             
         Returns:
             Optional[str]: Extracted text or None if processing fails
         """
         try:
-            # Save the uploaded file
-            filepath = self.save_uploaded_file(file_content, filename)
-            
             # Extract text based on file type
             if filename.lower().endswith('.pdf'):
+                # Save the uploaded file
+                filepath = self.save_uploaded_file(file, filename)
                 text = self.extract_text_from_pdf(filepath)
             elif filename.lower().endswith('.txt'):
-                text = self.extract_text_from_txt(filepath)
+                # Text files are decoded in memory and only written once, below
+                text = file.read().decode('utf-8', errors='replace').strip()
+                if not text:
+                    logger.warning(f"No text content found in TXT file: {filename}")
             else:
                 logger.error(f"Unsupported file type: {filename}")
                 return None
@@ -1,25 +1,278 @@
-from typing import List
+import os
+import asyncio
+import base64
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
 
-from openai import OpenAI
+import httpx
+import numpy as np
+import tiktoken
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+from openai.types import CreateEmbeddingResponse
 
-from core.config import EMBEDDING_MODEL
+from core.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_TOKENS,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+)
+from core.settings import EMBEDDING_CACHE_PATH
+
+# Maximum number of bound parameters used in a single cache lookup (SQLite's default limit is 999)
+CACHE_LOOKUP_SIZE = 500
+
+# Number of embeddings kept in memory (a 3072-dimensional float32 embedding takes 12 KB)
+MEMORY_CACHE_SIZE = 4096
+
+# Tokenizer used by the embedding models
+ENCODING = tiktoken.get_encoding("cl100k_base")
+
+# Shared by all embedders, so concurrent requests to the OpenAI API reuse warm connections multiplexed over HTTP/2
+ASYNC_HTTP_CLIENT = DefaultAsyncHttpxClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+    ),
+)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the number of embedding model tokens in a text.
+
+    :param text: Text to be counted.
+
+    :return: Number of tokens.
+    """
+    return len(ENCODING.encode(text, disallowed_special=()))
 
 
 class Embedder:
-    def __init__(self):
+    # Recently used embeddings keyed by (model, text hash), shared by all instances in the process
+    _memory_cache: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+    _memory_cache_lock = threading.Lock()
+
+    def __init__(self, cache_path: str = EMBEDDING_CACHE_PATH, http_client: httpx.AsyncClient = ASYNC_HTTP_CLIENT):
         self.openai_client = OpenAI()
+        self.async_openai_client = AsyncOpenAI(http_client=http_client)
 
-    def openai_embedding(self, text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._cache = sqlite3.connect(cache_path, check_same_thread=False)
+        self._cache_lock = threading.Lock()
+        with self._cache_lock, self._cache:
+            self._cache.execute(
+                "CREATE TABLE IF NOT EXISTS emb (model TEXT, h BLOB, vec BLOB, PRIMARY KEY (model, h))"
+            )
+
+    def openai_embedding(self, text: str, model: str = EMBEDDING_MODEL) -> np.ndarray:
         """
         Get the embedding of a text using OpenAI API.
 
         :param text: Text to be embedded.
         :param model: OpenAI model to be used for embedding.
 
-        :return: List of floats representing the embedding of the text.
+        :return: Float32 array representing the embedding of the text.
+        """
+        return self.openai_embedding_batch([text], model=model)[0]
+
+    def openai_embedding_batch(
+        self, texts: List[str], model: str = EMBEDDING_MODEL, persist: bool = True
+    ) -> List[np.ndarray]:
+        """
+        Get the embeddings of multiple texts using as few OpenAI API calls as possible. Embeddings are cached on disk
+        by (model, sha256(text)), so only texts that were never embedded before are sent to the API.
+
+        :param texts: Texts to be embedded.
+        :param model: OpenAI model to be used for embedding.
+        :param persist:
+            Whether to use the on-disk cache. One-off texts such as questions are only cached in memory, so they do
+            not cost a disk write each or grow the cache file without limit.
+
+        :return: List of embeddings, in the same order as the input texts.
+        """
+        hashes, embeddings = self._cached_embeddings(texts, model, persist=persist)
+
+        for batch_indices in self._uncached_batches(texts, embeddings):
+            response = self.openai_client.embeddings.create(
+                input=[texts[i] for i in batch_indices], model=model, encoding_format="base64"
+            )
+            self._store_response(model, response, batch_indices, hashes, embeddings, persist=persist)
+
+        return embeddings
+
+    async def openai_embedding_batch_async(
+        self, texts: List[str], model: str = EMBEDDING_MODEL
+    ) -> List[np.ndarray]:
+        """
+        Asynchronous version of `openai_embedding_batch`, which does not block the event loop while waiting for the
+        OpenAI API.
+
+        :param texts: Texts to be embedded.
+        :param model: OpenAI model to be used for embedding.
+
+        :return: List of embeddings, in the same order as the input texts.
+        """
+        # Hashing, the SQLite cache and token counting run on a worker thread, so they do not stall the event loop
+        hashes, embeddings = await asyncio.to_thread(self._cached_embeddings, texts, model)
+        batches = await asyncio.to_thread(self._uncached_batches, texts, embeddings)
+
+        for batch_indices in batches:
+            response = await self.async_openai_client.embeddings.create(
+                input=[texts[i] for i in batch_indices], model=model, encoding_format="base64"
+            )
+            await asyncio.to_thread(self._store_response, model, response, batch_indices, hashes, embeddings)
+
+        return embeddings
+
+    def _cached_embeddings(
+        self, texts: List[str], model: str, persist: bool = True
+    ) -> Tuple[List[bytes], List[Optional[np.ndarray]]]:
+        """
+        Hash the texts and look up their embeddings in the cache.
+
+        :param texts: Texts to be embedded.
+        :param model: OpenAI model to be used for embedding.
+        :param persist: Whether to look up embeddings missing from memory in the on-disk cache.
+
+        :return: Hashes of the texts and their cached embeddings, with None for texts that are not cached.
+        """
+        hashes = [hashlib.sha256(text.encode('utf-8')).digest() for text in texts]
+        embeddings = self._memory_lookup(model, hashes)
+
+        missing_hashes = [h for h, embedding in zip(hashes, embeddings) if embedding is None]
+        if missing_hashes and persist:
+            cached = self._cache_lookup(model, missing_hashes)
+            self._memory_store(model, cached.items())
+            embeddings = [cached.get(h) if embedding is None else embedding for h, embedding in zip(hashes, embeddings)]
+
+        return hashes, embeddings
+
+    @staticmethod
+    def _uncached_batches(texts: List[str], embeddings: List[Optional[np.ndarray]]) -> List[List[int]]:
+        """
+        Split the indices of texts missing from the cache into batches accepted by a single OpenAI API call, which
+        limits both the number of inputs and their total number of tokens (300k, EMBEDDING_BATCH_TOKENS leaves a
+        margin below it).
+
+        :param texts: Texts to be embedded.
+        :param embeddings: Cached embeddings, with None for texts that are not cached.
+
+        :return: Lists of indices.
+        """
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for i, embedding in enumerate(embeddings):
+            if embedding is not None:
+                continue
+
+            tokens = count_tokens(texts[i])
+            if batch and (len(batch) == EMBEDDING_BATCH_SIZE or batch_tokens + tokens > EMBEDDING_BATCH_TOKENS):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+
+            batch.append(i)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _store_response(
+        self,
+        model: str,
+        response: CreateEmbeddingResponse,
+        batch_indices: List[int],
+        hashes: List[bytes],
+        embeddings: List[Optional[np.ndarray]],
+        persist: bool = True,
+    ) -> None:
+        """
+        Fill in the embeddings returned by the OpenAI API and store them in the cache.
+
+        :param model: OpenAI model used for embedding.
+        :param response: Response of the OpenAI embeddings API.
+        :param batch_indices: Indices of the texts that were sent in the request.
+        :param hashes: Hashes of all texts.
+        :param embeddings: Embeddings of all texts, updated in place.
+        :param persist: Whether to also store the embeddings in the on-disk cache.
+        """
+        # Embeddings are requested base64 encoded, which decodes straight into a float32 array
+        for i, d in zip(batch_indices, sorted(response.data, key=lambda d: d.index)):
+            embeddings[i] = np.frombuffer(base64.b64decode(d.embedding), dtype=np.float32)
+
+        items = [(hashes[i], embeddings[i]) for i in batch_indices]
+        self._memory_store(model, items)
+        if persist:
+            self._cache_store(model, items)
+
+    def _memory_lookup(self, model: str, hashes: List[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Fetch embeddings from the in-memory cache, marking them as recently used.
+
+        :param model: OpenAI model the embeddings were created with.
+        :param hashes: SHA-256 digests of the texts.
+
+        :return: Cached embedding for every hash, with None for hashes that are not in memory.
+        """
+        embeddings = []
+        with self._memory_cache_lock:
+            for h in hashes:
+                embedding = self._memory_cache.get((model, h))
+                if embedding is not None:
+                    self._memory_cache.move_to_end((model, h))
+                embeddings.append(embedding)
+        return embeddings
+
+    def _memory_store(self, model: str, items: Iterable[Tuple[bytes, np.ndarray]]) -> None:
+        """
+        Add embeddings to the in-memory cache, evicting the least recently used ones above MEMORY_CACHE_SIZE.
+
+        :param model: OpenAI model the embeddings were created with.
+        :param items: (text hash, embedding) tuples.
+        """
+        with self._memory_cache_lock:
+            for h, embedding in items:
+                self._memory_cache[(model, h)] = embedding
+                self._memory_cache.move_to_end((model, h))
+            while len(self._memory_cache) > MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+
+    def _cache_lookup(self, model: str, hashes: List[bytes]) -> dict:
+        """
+        Fetch the cached embeddings for the given text hashes.
+
+        :param model: OpenAI model the embeddings were created with.
+        :param hashes: SHA-256 digests of the texts.
+
+        :return: Dictionary mapping text hash to its cached embedding.
+        """
+        cached = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._cache_lock:
+            for start in range(0, len(unique_hashes), CACHE_LOOKUP_SIZE):
+                batch = unique_hashes[start:start + CACHE_LOOKUP_SIZE]
+                rows = self._cache.execute(
+                    f"SELECT h, vec FROM emb WHERE model = ? AND h IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for h, vec in rows:
+                    cached[h] = np.frombuffer(vec, dtype=np.float32)
+        return cached
+
+    def _cache_store(self, model: str, items: List[tuple]) -> None:
+        """
+        Store newly created embeddings in the cache.
+
+        :param model: OpenAI model the embeddings were created with.
+        :param items: List of (text hash, embedding) tuples.
         """
-        return (
-            self.openai_client.embeddings.create(input=[text], model=model)
-            .data[0]
-            .embedding
-        )
\ No newline at end of file
+        rows = [(model, h, embedding.astype(np.float32, copy=False).tobytes()) for h, embedding in items]
+        with self._cache_lock, self._cache:
+            self._cache.executemany("INSERT OR REPLACE INTO emb (model, h, vec) VALUES (?, ?, ?)", rows)
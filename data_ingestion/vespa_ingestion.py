@@ -1,16 +1,58 @@
 import os
 import json
-from typing import List, Dict, Any
-import glob
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 import hashlib
 
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from vespa.application import VespaAsync
+from core.config import INGESTION_CONCURRENCY, VESPA_FEED_CONNECTIONS
 from core.logger import get_logger
 from core.settings import ROOT_DIR, VESPA_HOST, VESPA_PORT
-from data_ingestion.text_embedder import Embedder
+from data_ingestion.text_embedder import Embedder, count_tokens
 from data_model.vespa_ai.vespa_client import VespaClient
 
-logger = get_logger(__name__, log_file="ingestion.log")
+logger = get_logger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+MIN_CHUNK_TOKENS = 100
+
+# Shorter matches between the end of a chunk and the start of the next one are not treated as splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+# Chunk size and overlap are measured in tokens
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 64
+
+# The splitter holds no per-document state, so a single instance is shared by every DocumentIngestion
+TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=count_tokens,
+    separators=["\n\n", "\n", ". ", " ", ""],
+    is_separator_regex=False,
+)
+
+
+def strip_overlap(previous: str, chunk: str) -> str:
+    """Remove the start of a chunk that repeats the end of the previous chunk, as left by the splitter's overlap"""
+    # The smallest matching start in the previous chunk gives the longest overlap
+    for start in range(max(0, len(previous) - len(chunk)), len(previous) - MIN_OVERLAP_CHARS + 1):
+        if chunk.startswith(previous[start:]):
+            return chunk[len(previous) - start:].lstrip()
+    return chunk
+
+
+def to_int8_hex(embedding: np.ndarray) -> str:
+    """Encode an embedding as the hex string of its int8 cells, the compact feed format for Vespa dense tensors"""
+    # Scale every vector to the full int8 range on its own. The scale is not stored, since the angular distance used
+    # for ranking does not depend on the length of the vectors. The embedding fields of the resources and chunks
+    # schemas must therefore keep distance-metric: angular
+    scale = np.abs(embedding).max() / 127 or 1.0
+    int8_cells = np.clip(np.round(embedding / scale), -127, 127).astype(np.int8)
+    return int8_cells.tobytes().hex().upper()
+
 
 class DocumentIngestion:
     def __init__(self):
@@ -19,55 +61,69 @@ class DocumentIngestion:
         self.embedder = Embedder()
         self.data_dir = os.path.join(ROOT_DIR, "data")
         
-        self.chunk_size = 1000
-        self.chunk_overlap = 200
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            is_separator_regex=False,
-        )
+        self.chunk_size = CHUNK_SIZE
+        self.chunk_overlap = CHUNK_OVERLAP
+        self.text_splitter = TEXT_SPLITTER
     
-    def get_files_to_ingest(self) -> List[str]:
-        """Get list of all text files in the data directory"""
+    def get_files_to_ingest(self) -> List[Tuple[str, int]]:
+        """Get list of all text files in the data directory with their sizes in bytes, largest first"""
         try:
-            # Find all .txt files in data directory
-            txt_files = glob.glob(os.path.join(self.data_dir, "*.txt"))
+            # Find all .txt files in data directory in a single directory scan
+            with os.scandir(self.data_dir) as entries:
+                txt_files = [
+                    (entry.path, entry.stat().st_size)
+                    for entry in entries
+                    if entry.name.endswith(".txt") and entry.is_file()
+                ]
+            
+            # Start with the largest files so they overlap with the smaller ones during concurrent ingestion
+            txt_files.sort(key=lambda txt_file: -txt_file[1])
             logger.info(f"Found {len(txt_files)} text files in data directory")
             return txt_files
         except Exception as e:
             logger.error(f"Error getting files to ingest: {str(e)}")
             raise
     
-    def read_file(self, file_path: str) -> str:
-        """Read content from a file"""
+    def read_file(self, file_path: str) -> Tuple[str, str]:
+        """Read content from a file, hashing it block by block while reading. Returns the content and its MD5 hash"""
         try:
+            content_hash = hashlib.md5()
+            blocks = []
+            # Text mode translates \r\n and \r line endings to \n, as they were when the existing resource ids were hashed
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            logger.info(f"Successfully read file: {file_path}")
-            return content
+                while block := f.read(READ_BLOCK_SIZE):
+                    content_hash.update(block.encode('utf-8'))
+                    blocks.append(block)
+            content = ''.join(blocks)
+            logger.debug(f"Successfully read file: {file_path}")
+            return content, content_hash.hexdigest()
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {str(e)}")
             raise
     
-    def create_resource_document(self, file_path: str, content: str) -> Dict[str, Any]:
+    def create_resource_document(
+        self,
+        file_path: str,
+        content: str,
+        resource_id: str,
+        file_size: int,
+        embedding: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
         """Create a resource document for the Vespa resources schema"""
         try:
-            resource_id = hashlib.md5(content.encode('utf-8')).hexdigest()
-            
             # Extract title from filename
             filename = os.path.basename(file_path)
             title = os.path.splitext(filename)[0]
             
-            # Generate embedding for the whole content
-            logger.info(f"Generating embedding for resource: {title}")
-            embedding = self.embedder.openai_embedding(content)
+            # Generate embedding for the whole content, unless it was already computed
+            if embedding is None:
+                logger.debug(f"Generating embedding for resource: {title}")
+                embedding = self.embedder.openai_embedding(content)
             
             metadata = {
                 "source": file_path,
                 "file_type": "text",
-                "file_size": len(content)
+                "file_size": file_size
             }
             
             resource_doc = {
@@ -75,34 +131,68 @@ class DocumentIngestion:
                 "fields": {
                     "resource_id": resource_id,
                     "title": title,
-                    "resource_text": content,
-                    "embedding": embedding,
+                    "embedding": {"values": to_int8_hex(embedding)},
                     "metadata": json.dumps(metadata)
                 }
             }
             
-            logger.info(f"Created resource document for {title} with ID: {resource_id}")
+            logger.debug(f"Created resource document for {title} with ID: {resource_id}")
             return resource_doc
         except Exception as e:
             logger.error(f"Error creating resource document for {file_path}: {str(e)}")
             raise
     
-    def chunk_document(self, resource_id: str, content: str) -> List[Dict[str, Any]]:
-        """Split document into chunks using LangChain's RecursiveCharacterTextSplitter"""
+    def split_document(self, content: str) -> List[str]:
+        """Split document text into chunks using LangChain's RecursiveCharacterTextSplitter"""
+        chunks = self.merge_small_chunks(self.text_splitter.split_text(content))
+        logger.debug(f"Document split into {len(chunks)} chunks")
+        return chunks
+    
+    def merge_small_chunks(self, chunks: List[str]) -> List[str]:
+        """Merge chunks shorter than MIN_CHUNK_TOKENS into their preceding chunk, as long as the result stays small enough"""
+        max_tokens = int(self.chunk_size * 1.1)
+        merged, merged_tokens = [], []
+        
+        for chunk in chunks:
+            tokens = count_tokens(chunk)
+            is_small = tokens < MIN_CHUNK_TOKENS or (merged and merged_tokens[-1] < MIN_CHUNK_TOKENS)
+            
+            if merged and is_small:
+                # Neighbouring chunks overlap by up to CHUNK_OVERLAP tokens, which must appear only once when merged
+                new_text = strip_overlap(merged[-1], chunk)
+                new_tokens = count_tokens(new_text)
+                
+                if merged_tokens[-1] + new_tokens <= max_tokens:
+                    if new_text:
+                        merged[-1] = f"{merged[-1]}\n{new_text}"
+                        merged_tokens[-1] += new_tokens
+                    continue
+            
+            merged.append(chunk)
+            merged_tokens.append(tokens)
+        
+        return merged
+    
+    def chunk_document(
+        self, resource_id: str, chunks: List[str], embeddings: Optional[List[np.ndarray]] = None
+    ) -> List[Dict[str, Any]]:
+        """Create chunk documents for the Vespa chunks schema from already split document text"""
         try:
-            # Split the text into chunks
-            logger.info(f"Splitting document with resource_id {resource_id} into chunks")
-            chunks = self.text_splitter.split_text(content)
-            logger.info(f"Document split into {len(chunks)} chunks")
+            # Generate embeddings for all chunks in a single batched request
+            if embeddings is None:
+                logger.debug(f"Generating embeddings for {len(chunks)} chunks of resource {resource_id}")
+                embeddings = self.embedder.openai_embedding_batch(chunks)
             
             chunk_documents = []
             
+            # Chunk IDs are md5(resource_id + chunk_text), so hash the constant prefix only once
+            base_hash = hashlib.md5(resource_id.encode('utf-8'))
+            
             # Process each chunk
-            for i, chunk_text in enumerate(chunks):
-                chunk_id = hashlib.md5(f"{resource_id}{chunk_text}".encode('utf-8')).hexdigest()
-                
-                logger.info(f"Generating embedding for chunk {i+1}/{len(chunks)}")
-                embedding = self.embedder.openai_embedding(chunk_text)
+            for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
+                chunk_hash = base_hash.copy()
+                chunk_hash.update(chunk_text.encode('utf-8'))
+                chunk_id = chunk_hash.hexdigest()
                 
                 metadata = {
                     "chunk_index": i,
@@ -115,7 +205,7 @@ class DocumentIngestion:
                         "chunk_id": chunk_id,
                         "resource_id": resource_id,
                         "chunk_text": chunk_text,
-                        "embedding": embedding,
+                        "embedding": {"values": to_int8_hex(embedding)},
                         "metadata": json.dumps(metadata)
                     }
                 }
@@ -127,33 +217,65 @@ class DocumentIngestion:
             logger.error(f"Error chunking document {resource_id}: {str(e)}")
             raise
     
-    def ingest_documents(self):
-        """Ingest all documents from the data directory into Vespa"""
+    async def ingest_file(
+        self, file_path: str, file_size: int, vespa_session: VespaAsync
+    ) -> List[Tuple[Dict, np.ndarray]]:
+        """Ingest a single document into Vespa, returning its (chunk document, embedding) pairs"""
+        logger.info(f"Processing file: {file_path}")
+        
+        # Reading and tokenizing run on a worker thread, so they do not stall the event loop
+        content, resource_id = await asyncio.to_thread(self.read_file, file_path)
+        chunks = await asyncio.to_thread(self.split_document, content)
+        
+        # Embed the whole resource and all of its chunks in one batched request
+        logger.debug(f"Generating embeddings for resource and {len(chunks)} chunks")
+        embeddings = await self.embedder.openai_embedding_batch_async([content] + chunks)
+        
+        # Create a resource document and insert it into Vespa
+        resource_doc = self.create_resource_document(file_path, content, resource_id, file_size, embeddings[0])
+        
+        logger.debug(f"Inserting resource document into Vespa: {resource_id}")
+        await self.vespa_client.insert_one_async("resources", resource_doc, vespa_session)
+        
+        # Insert chunks into Vespa
+        chunk_docs = await asyncio.to_thread(self.chunk_document, resource_id, chunks, embeddings[1:])
+        
+        logger.debug(f"Inserting {len(chunk_docs)} chunk documents into Vespa")
+        await self.vespa_client.feed_many_async(
+            "chunks", chunk_docs, vespa_session, max_connections=VESPA_FEED_CONNECTIONS
+        )
+        
+        logger.info(f"Successfully processed and ingested file: {file_path}")
+        return list(zip(chunk_docs, embeddings[1:]))
+    
+    async def ingest_documents(self) -> Tuple[List[Tuple[Dict, np.ndarray]], List[str]]:
+        """Ingest all documents from the data directory into Vespa concurrently. Returns the fed (chunk, embedding) pairs and the paths of the files that failed"""
         try:
             # Get all files to ingest
             files = self.get_files_to_ingest()
+            semaphore = asyncio.Semaphore(INGESTION_CONCURRENCY)
             
-            for file_path in files:
-                logger.info(f"Processing file: {file_path}")
-                
-                content = self.read_file(file_path)
-                
-                # Create a resource document and insert it into Vespa
-                resource_doc = self.create_resource_document(file_path, content)
-                resource_id = resource_doc["id"]
-                
-                logger.info(f"Inserting resource document into Vespa: {resource_id}")
-                self.vespa_client.insert_one("resources", resource_doc)
+            async with self.vespa_client.async_session(connections=VESPA_FEED_CONNECTIONS) as vespa_session:
+                async def ingest_bounded(file_path: str, file_size: int):
+                    async with semaphore:
+                        return await self.ingest_file(file_path, file_size, vespa_session)
                 
-                # Insert chunks into Vespa
-                chunk_docs = self.chunk_document(resource_id, content)
-                
-                logger.info(f"Inserting {len(chunk_docs)} chunk documents into Vespa")
-                self.vespa_client.insert_many("chunks", chunk_docs)
-                
-                logger.info(f"Successfully processed and ingested file: {file_path}")
+                # Every file runs to completion before the session is closed, so one failure does not abort the others
+                results = await asyncio.gather(
+                    *(ingest_bounded(file_path, file_size) for file_path, file_size in files), return_exceptions=True
+                )
             
-            logger.info(f"Document ingestion complete. Processed {len(files)} files")
+            ingested_chunks = []
+            failed_files = []
+            for (file_path, _), result in zip(files, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Error ingesting file {file_path}: {str(result)}")
+                    failed_files.append(file_path)
+                else:
+                    ingested_chunks.extend(result)
+            
+            logger.info(f"Document ingestion complete. Processed {len(files) - len(failed_files)} of {len(files)} files")
+            return ingested_chunks, failed_files
         except Exception as e:
             logger.error(f"Error during document ingestion: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,99 @@
+"""
+Recompute the embeddings of every document already stored in Vespa.
+
+Changing the cell type of an embedding field (allowed by the field-type-change validation override) drops the stored
+embeddings, so nearest neighbor search returns nothing until they are fed again. Chunk texts survive the change, so
+chunk embeddings are recomputed from them, mostly from the embedding cache. Resource texts are not stored, so resource
+embeddings are recomputed from their chunks joined in order.
+
+Run after deploying the application package:
+
+    python -m data_ingestion.vespa_reembedding
+"""
+import json
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from core.logger import configure_logging, get_logger
+from core.settings import VESPA_HOST, VESPA_PORT
+from data_ingestion.text_embedder import Embedder
+from data_ingestion.vespa_ingestion import strip_overlap, to_int8_hex
+from data_model.vespa_ai.vespa_client import VespaClient
+
+logger = get_logger(__name__)
+
+# Texts embedded per API call, kept well below the per-request token limit (chunks hold up to ~560 tokens, resources
+# hold whole documents)
+CHUNK_BATCH_SIZE = 256
+RESOURCE_BATCH_SIZE = 8
+
+
+class DocumentReembedding:
+    def __init__(self):
+        """Initialize the re-embedding with Vespa client and embedder"""
+        self.vespa_client = VespaClient(vespa_host=VESPA_HOST, vespa_port=VESPA_PORT)
+        self.embedder = Embedder()
+
+    def update_embeddings(self, collection_name: str, ids: List[str], texts: List[str]):
+        """Embed the texts and assign the embeddings to the records with the given IDs"""
+        embeddings = self.embedder.openai_embedding_batch(texts)
+        records = [
+            {"id": record_id, "fields": {"embedding": {"values": to_int8_hex(embedding)}}}
+            for record_id, embedding in zip(ids, embeddings)
+        ]
+        self.vespa_client.update_many(collection_name, records)
+
+    def reembed_chunks(self) -> Dict[str, List[Tuple[int, str]]]:
+        """Recompute the embeddings of all chunks, returning the (chunk index, text) pairs of every resource"""
+        chunks_by_resource = defaultdict(list)
+        ids, texts = [], []
+        
+        for document in self.vespa_client.visit('chunks', fields=['chunk_id', 'resource_id', 'chunk_text', 'metadata']):
+            fields = document["fields"]
+            chunk_index = json.loads(fields["metadata"])["chunk_index"]
+            chunks_by_resource[fields["resource_id"]].append((chunk_index, fields["chunk_text"]))
+            
+            ids.append(fields["chunk_id"])
+            texts.append(fields["chunk_text"])
+            if len(ids) == CHUNK_BATCH_SIZE:
+                self.update_embeddings('chunks', ids, texts)
+                ids, texts = [], []
+        
+        if ids:
+            self.update_embeddings('chunks', ids, texts)
+        
+        logger.info(f"Re-embedded chunks of {len(chunks_by_resource)} resources")
+        return chunks_by_resource
+
+    def reembed_resources(self, chunks_by_resource: Dict[str, List[Tuple[int, str]]]):
+        """Recompute the embeddings of all resources from the text of their chunks"""
+        ids, texts = [], []
+        
+        for resource_id, chunks in chunks_by_resource.items():
+            # Rebuild the resource text without the overlap the splitter left between neighbouring chunks
+            text = ""
+            for _, chunk_text in sorted(chunks):
+                text = f"{text}\n{strip_overlap(text, chunk_text)}" if text else chunk_text
+            
+            ids.append(resource_id)
+            texts.append(text)
+        
+        for start in range(0, len(ids), RESOURCE_BATCH_SIZE):
+            self.update_embeddings(
+                'resources', ids[start:start + RESOURCE_BATCH_SIZE], texts[start:start + RESOURCE_BATCH_SIZE]
+            )
+        
+        logger.info(f"Re-embedded {len(ids)} resources")
+
+    def reembed_documents(self):
+        """Recompute the embeddings of all chunks and resources stored in Vespa"""
+        try:
+            self.reembed_resources(self.reembed_chunks())
+        except Exception as e:
+            logger.error(f"Error during re-embedding: {str(e)}")
+            raise
+
+
+if __name__ == "__main__":
+    configure_logging("reembedding.log")
+    DocumentReembedding().reembed_documents()
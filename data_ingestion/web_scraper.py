@@ -1,57 +1,151 @@
 from bs4 import BeautifulSoup
 from typing import List, Optional
+from urllib.parse import urlsplit
+import httpx
+from selectolax.lexbor import LexborHTMLParser
 from core.logger import get_logger
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-import time
 from core.settings import ROOT_DIR
 import os
 
-logger = get_logger(__name__, log_file="ingestion.log")
+logger = get_logger(__name__)
+
+# Pages whose static HTML yields less text than this are assumed to be rendered by JavaScript
+MIN_STATIC_TEXT_LENGTH = 500
 
 class URLIngestion:
     def __init__(self):
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--window-size=1920,1080')
+        self._driver = None
+        self._http_client = httpx.Client(follow_redirects=True, timeout=10)
+
+    @property
+    def driver(self) -> webdriver.Chrome:
+        """
+        Chrome WebDriver, started on first use since most pages can be scraped without a browser.
+        """
+        if self._driver is None:
+            chrome_options = Options()
+            chrome_options.add_argument('--headless')
+            chrome_options.add_argument('--no-sandbox')
+            chrome_options.add_argument('--disable-dev-shm-usage')
+            chrome_options.add_argument('--window-size=1920,1080')
+            
+            self._driver = webdriver.Chrome(options=chrome_options)
+        
+        return self._driver
+
+    def close(self) -> None:
+        """
+        Close the HTTP client and quit the WebDriver, if it was started.
+        """
+        self._http_client.close()
         
-        self.driver = webdriver.Chrome(options=chrome_options)
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
+
+    @staticmethod
+    def normalize_url(url: str) -> Optional[str]:
+        """
+        Normalize a URL so that trivially different spellings of the same page are scraped only once. The scheme and
+        host are lowercased, the fragment and any trailing slash of the path are dropped.
         
-    def extract_text_from_url(self, url: str) -> Optional[str]:
+        :param url: URL to normalize
+        :return: Normalized URL, or None if the URL is not a valid HTTP(S) URL
         """
-        Extract text content from a given URL using Selenium and BeautifulSoup.
+        parts = urlsplit(url.strip())
+        if parts.scheme.lower() not in ('http', 'https') or not parts.netloc:
+            return None
+        
+        normalized_url = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+        if parts.query:
+            normalized_url += f"?{parts.query}"
+        return normalized_url
 
-        :param url: URL to extract text from
-        :return: Extracted text or None if extraction fails
+    @staticmethod
+    def clean_text(text: str) -> str:
+        """
+        Strip every line of the text and drop the empty ones.
+        
+        :param text: Text to clean
+        :return: Cleaned text
+        """
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        return '\n'.join(lines)
+
+    def html_to_text(self, html: str) -> str:
+        """
+        Extract visible text from an HTML document, using selectolax and falling back to BeautifulSoup if it fails.
+        
+        :param html: HTML document
+        :return: Cleaned text content of the document
         """
         try:
-            logger.info(f"Attempting to extract text from URL: {url}")
-            
-            # Wait for the dynamic content to load before scraping
-            self.driver.get(url)
+            tree = LexborHTMLParser(html)
             
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            time.sleep(3)
+            # Remove script and style elements
+            for node in tree.css("script,style"):
+                node.decompose()
             
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            text = tree.body.text(separator='\n', strip=True) if tree.body is not None else ""
+        except Exception as e:
+            logger.warning(f"selectolax failed to parse HTML, falling back to BeautifulSoup: {str(e)}")
+            soup = BeautifulSoup(html, 'html.parser')
             
-            # Remove script and style elements
             for script in soup(["script", "style"]):
                 script.decompose()
             
-            # Get text and clean it
             text = soup.get_text(separator='\n', strip=True)
+        
+        return self.clean_text(text)
+
+    def _fetch_static(self, url: str) -> Optional[str]:
+        """
+        Extract text content from a given URL with a plain HTTP request, without running any JavaScript.
+        
+        :param url: URL to extract text from
+        :return: Extracted text, or None if the page could not be fetched
+        :raises ValueError: If the URL does not point to an HTML page
+        """
+        try:
+            response = self._http_client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Static fetch failed for URL {url}: {str(e)}")
+            return None
+        
+        content_type = response.headers.get("content-type", "")
+        if "html" not in content_type:
+            raise ValueError(f"URL does not point to an HTML page (content type: {content_type})")
+        
+        return self.html_to_text(response.text)
+
+    def extract_text_from_url(self, url: str) -> Optional[str]:
+        """
+        Extract text content from a given URL. The page is fetched over plain HTTP first, and only rendered with
+        Selenium if the static HTML does not contain enough text.
+        
+        :param url: URL to extract text from
+        :return: Extracted text or None if extraction fails
+        """
+        try:
+            logger.info(f"Attempting to extract text from URL: {url}")
+            
+            text = self._fetch_static(url)
             
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            text = '\n'.join(lines)
+            if text is None or len(text) < MIN_STATIC_TEXT_LENGTH:
+                logger.info(f"Static HTML has too little text, rendering URL with Selenium: {url}")
+                
+                # Wait for the dynamic content to load before scraping
+                self.driver.get(url)
+                
+                WebDriverWait(self.driver, 10).until(
+                    lambda driver: driver.execute_script("return document.readyState") == "complete"
+                )
+                
+                text = self.html_to_text(self.driver.page_source)
             
             if text:
                 logger.info(f"Successfully extracted text from URL: {url}")
@@ -59,7 +153,7 @@ class URLIngestion:
             else:
                 logger.warning(f"No text content found at URL: {url}")
                 return None
-            
+        
         except Exception as e:
             logger.error(f"Error extracting text from URL {url}: {str(e)}")
             return None
@@ -67,29 +161,26 @@ class URLIngestion:
     def process_urls(self, urls: List[str]) -> None:
         """
         Process a list of URLs and extract text from each one.
-
+        
         :param urls: List of URLs to process
         """
         logger.info(f"Starting to process {len(urls)} URLs")
         
-        try:
-            for url in urls:
-                text = self.extract_text_from_url(url)
-                if text:
-                    # Create a filename from the URL
-                    filename = url.split('/')[-1] or 'index'
-                    filename = f"{filename}.txt"
-                    
-                    data_dir = os.path.join(ROOT_DIR, "data")
-                    os.makedirs(data_dir, exist_ok=True)
-                    filepath = os.path.join(data_dir, filename)
-                    
-                    # Save the text to file
-                    try:
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            f.write(text)
-                        logger.info(f"Successfully saved extracted text to {filepath}")
-                    except Exception as e:
-                        logger.error(f"Failed to save text to file {filepath}: {str(e)}")
-        finally:
-            self.driver.quit()
\ No newline at end of file
+        for url in urls:
+            text = self.extract_text_from_url(url)
+            if text:
+                # Create a filename from the URL
+                filename = url.split('/')[-1] or 'index'
+                filename = f"{filename}.txt"
+                
+                data_dir = os.path.join(ROOT_DIR, "data")
+                os.makedirs(data_dir, exist_ok=True)
+                filepath = os.path.join(data_dir, filename)
+                
+                # Save the text to file
+                try:
+                    with open(filepath, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                    logger.info(f"Successfully saved extracted text to {filepath}")
+                except Exception as e:
+                    logger.error(f"Failed to save text to file {filepath}: {str(e)}")
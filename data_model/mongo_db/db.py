@@ -1,10 +1,49 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
+from pymongo import DESCENDING, ReturnDocument
+from core.config import (
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_COMPRESSORS,
+)
 from core.settings import MONGO_URI, DATABASE_NAME
 from data_model.mongo_db.schemas.user import User
 from data_model.mongo_db.schemas.session import Session
 
-async def init_db():
-    client = AsyncIOMotorClient(MONGO_URI)
+COUNTERS_COLLECTION = "counters"
+
+async def init_db() -> AsyncIOMotorClient:
+    # Created once per process, keeping a pool of warm connections that all requests share
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        # Conversation messages are long text, so compressing the wire protocol shrinks session reads and writes
+        compressors=MONGO_COMPRESSORS,
+    )
     db = client[DATABASE_NAME]
-    await init_beanie(database=db, document_models=[User, Session])
\ No newline at end of file
+    await init_beanie(database=db, document_models=[User, Session])
+
+    # Start the user id counter after the highest id assigned so far, so existing users keep unique ids
+    last_user = await db[User.Settings.collection].find_one({}, {"user_id": 1}, sort=[("user_id", DESCENDING)])
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": "user_id"}, {"$max": {"seq": last_user["user_id"] if last_user else 0}}, upsert=True
+    )
+
+    return client
+
+async def next_sequence_value(name: str) -> int:
+    """
+    Atomically increment a named counter, so concurrent callers never get the same value.
+
+    :param name: Name of the counter, e.g. "user_id".
+
+    :return: The incremented value of the counter.
+    """
+    counters = User.get_motor_collection().database[COUNTERS_COLLECTION]
+    counter = await counters.find_one_and_update(
+        {"_id": name}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
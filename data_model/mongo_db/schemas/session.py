@@ -3,6 +3,7 @@ from typing import List
 
 from beanie import Document
 from pydantic import Field, BaseModel
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 class Message(BaseModel):
     content: str
@@ -17,4 +18,10 @@ class Session(Document):
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     class Settings:
-        collection = "sessions"
\ No newline at end of file
+        collection = "sessions"
+        indexes = [
+            # Serves looking up a session together with the ownership check in a single indexed query
+            IndexModel([("session_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+            # Serves listing a user's sessions, newest first, without a collection scan or an in-memory sort
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        ]
\ No newline at end of file
@@ -19,4 +19,9 @@ class SessionResponse(BaseModel):
     session_id: str
     messages: List[MessageResponse]
     created_at: datetime
-    updated_at: datetime 
\ No newline at end of file
+    updated_at: datetime 
+
+class SessionSummaryResponse(BaseModel):
+    session_id: str
+    created_at: datetime
+    updated_at: datetime
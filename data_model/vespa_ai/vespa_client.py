@@ -1,5 +1,6 @@
-from vespa.application import Vespa
-from typing import Dict, Optional, List
+import asyncio
+from vespa.application import Vespa, VespaAsync
+from typing import Dict, Optional, List, Iterable, Iterator
 from datetime import datetime
 from requests.exceptions import HTTPError
 import traceback
@@ -134,6 +135,65 @@ class VespaClient:
             if response.status_code != 200:
                 raise Exception(f"Error while writing record with id {records[idx]['id']}\n\n{traceback.format_exc()}")
 
+    def async_session(self, connections: int = 100) -> VespaAsync:
+        """
+        Creates an asynchronous connection layer to Vespa, meant to be used as an async context manager and shared
+        between concurrent asynchronous operations.
+
+        :param: connections: Number of allowed concurrent connections.
+
+        :return: Vespa asynchronous connection layer.
+        """
+
+        return self.app.asyncio(connections=connections)
+
+    async def insert_one_async(self, collection_name: str, record: Dict, session: VespaAsync) -> None:
+        """
+        Asynchronous version of `insert_one`.
+
+        :param: collection_name: Schema where the record will be inserted.
+        :param: record: Data that will be inserted into database, in the same format as in `insert_one`.
+        :param: session: Open asynchronous connection layer created with `async_session`.
+        """
+
+        record['fields']['created_at'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        record['fields']['updated_at'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+
+        response = await session.feed_data_point(schema=collection_name, data_id=record['id'], fields=record['fields'])
+
+        if response.status_code != 200:
+            raise Exception(f"Error while writing record with id {record['id']}.\n\n{traceback.format_exc()}")
+
+    async def feed_many_async(
+        self, collection_name: str, records: Iterable[Dict], session: VespaAsync, max_connections: int = 16
+    ) -> None:
+        """
+        Feeds multiple records into the given collection, keeping up to `max_connections` feed operations in flight.
+        Records are pulled lazily from the iterable by a fixed pool of workers, so the next record is sent as soon as
+        any connection frees up, without creating a task per record up front.
+
+        :param: collection_name: Schema where the records will be inserted.
+        :param: records: Records that will be inserted into database, in the same format as in `insert_many`.
+        :param: session: Open asynchronous connection layer created with `async_session`.
+        :param: max_connections: Maximum number of concurrent feed operations.
+        """
+
+        records = iter(records)
+
+        async def feed_worker():
+            for record in records:
+                record['fields']['created_at'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+                record['fields']['updated_at'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+
+                response = await session.feed_data_point(
+                    schema=collection_name, data_id=record['id'], fields=record['fields']
+                )
+
+                if response.status_code != 200:
+                    raise Exception(f"Error while writing record with id {record['id']}\n\n{traceback.format_exc()}")
+
+        await asyncio.gather(*(feed_worker() for _ in range(max_connections)))
+
     def update_one(self, collection_name: str, record: Dict, upsert: bool = False):
         """
         Updates one record in the given collection.
@@ -264,3 +324,48 @@ class VespaClient:
 
         results = self.app.query(body=query_body)
         return results.hits
+
+    def count(self, collection_name: str) -> int:
+        """
+        Count the records of a collection.
+
+        :param: collection_name: Collection whose records will be counted.
+
+        :return: Number of records in the collection.
+        """
+
+        results = self.app.query(body={"yql": f"select * from {collection_name} where true", "hits": 0})
+        return results.number_documents_retrieved
+
+    def visit(
+        self, collection_name: str, fields: Optional[List[str]] = None, wanted_document_count: int = 1000
+    ) -> Iterator[Dict]:
+        """
+        Iterate over all records of a collection with the Document V1 visit API, fetching them page by page.
+
+        :param: collection_name: Schema whose records will be visited.
+        :param: fields: Fields to fetch for each record. All fields are fetched if not given.
+        :param: wanted_document_count: Number of records requested per page.
+
+        :return: Iterator over the records, in the same format as returned by `find_one`. Tensor fields are returned
+            as plain lists of values.
+        """
+
+        end_point = f"{self.app.end_point}/document/v1/{collection_name}/{collection_name}/docid/"
+        params = {"wantedDocumentCount": wanted_document_count, "format.tensors": "short-value"}
+        if fields is not None:
+            params["fieldSet"] = f"{collection_name}:{','.join(fields)}"
+
+        with self.app.http() as sync_app:
+            while True:
+                response = sync_app.http_session.get(end_point, params=params, cert=sync_app.cert)
+
+                if response.status_code != 200:
+                    raise Exception(f"Error while visiting collection {collection_name}.\n\n{response.text}")
+
+                body = response.json()
+                yield from body.get("documents", [])
+
+                if "continuation" not in body:
+                    break
+                params["continuation"] = body["continuation"]
@@ -0,0 +1,190 @@
+import os
+import pickle
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AnswerCache:
+
+    def __init__(self, max_entries: int, similarity_threshold: float, ttl_seconds: int):
+        """
+        Cache of answers to standalone questions. A question hits the cache if the same normalized question was
+        answered before, or if the embedding of a previously answered question is at least `similarity_threshold`
+        cosine-similar to it. Entries expire after `ttl_seconds`, so answers follow newly ingested documents.
+
+        :param max_entries: Maximum number of cached answers. The oldest answer is replaced when the cache is full.
+        :param similarity_threshold: Minimum cosine similarity for a near-duplicate question to reuse an answer.
+        :param ttl_seconds: Number of seconds an answer stays valid.
+        """
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = [None] * max_entries
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._created_at = np.full(max_entries, -np.inf)
+        self._embeddings: Optional[np.ndarray] = None
+        self._next_slot = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Normalize a question so that trivially different spellings share the same cache key.
+
+        :param question: The question asked by the user.
+
+        :return: Lowercased question with collapsed whitespace.
+        """
+        return ' '.join(question.lower().split())
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: Share of lookups that were served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, question: str, embedding: np.ndarray) -> Optional[str]:
+        """
+        Look up the answer to a question.
+
+        :param question: The question asked by the user.
+        :param embedding: Embedding of the question.
+
+        :return: The cached answer, or None on a cache miss.
+        """
+        key = self.normalize(question)
+        now = time.time()
+
+        with self._lock:
+            slot = self._slots.get(key)
+
+            if slot is None and self._embeddings is not None:
+                scores = self._embeddings @ (embedding / np.linalg.norm(embedding))
+                scores[now - self._created_at > self.ttl_seconds] = -np.inf
+                best_slot = int(np.argmax(scores))
+                if scores[best_slot] >= self.similarity_threshold:
+                    slot = best_slot
+
+            if slot is None or now - self._created_at[slot] > self.ttl_seconds:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            logger.info(f"Answer cache hit, hit rate: {self.hit_rate:.2%}")
+            return self._answers[slot]
+
+    def put(self, question: str, embedding: np.ndarray, answer: str):
+        """
+        Store the answer to a question.
+
+        :param question: The question asked by the user.
+        :param embedding: Embedding of the question.
+        :param answer: The answer given by the chatbot.
+        """
+        key = self.normalize(question)
+
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._next_slot
+                self._next_slot = (self._next_slot + 1) % self.max_entries
+
+                # Evict the question previously stored in this slot
+                if self._keys[slot] is not None:
+                    del self._slots[self._keys[slot]]
+                self._slots[key] = slot
+
+            self._keys[slot] = key
+            self._answers[slot] = answer
+            self._created_at[slot] = time.time()
+            self._embeddings[slot] = embedding / np.linalg.norm(embedding)
+
+    def clear(self):
+        """
+        Drop all cached answers, e.g. after new documents have been ingested.
+        """
+        with self._lock:
+            self._clear_slots(range(self.max_entries))
+            self._next_slot = 0
+        logger.info("Cleared answer cache")
+
+    def _clear_slots(self, slots):
+        """
+        Empty the given slots. Their embeddings are left in place, but can no longer match since the slots never
+        become valid again until they are reused by `put`.
+
+        :param slots: Indices of the slots to empty.
+        """
+        for slot in slots:
+            if self._keys[slot] is not None:
+                del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._answers[slot] = None
+            self._created_at[slot] = -np.inf
+
+    def save(self, path: str):
+        """
+        Persist the cache to disk, so that it survives restarts.
+
+        :param path: Path of the pickle file.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock, open(path, 'wb') as file:
+            pickle.dump(
+                {
+                    "slots": self._slots,
+                    "keys": self._keys,
+                    "answers": self._answers,
+                    "created_at": self._created_at,
+                    "embeddings": self._embeddings,
+                    "next_slot": self._next_slot,
+                },
+                file,
+            )
+        logger.info(f"Saved answer cache to {path}")
+
+    def load(self, path: str):
+        """
+        Load a cache previously persisted with `save`. Does nothing if the file does not exist or was saved with a
+        different number of entries.
+
+        :param path: Path of the pickle file.
+        """
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+
+        if len(state["keys"]) != self.max_entries:
+            logger.warning(f"Ignoring answer cache at {path}, it was saved with a different size")
+            return
+
+        with self._lock:
+            self._slots = state["slots"]
+            self._keys = state["keys"]
+            self._answers = state["answers"]
+            self._created_at = state["created_at"]
+            self._embeddings = state["embeddings"]
+            self._next_slot = state["next_slot"]
+
+            # Answers that expired while the application was not running are not restored
+            self._clear_slots(np.flatnonzero(time.time() - self._created_at > self.ttl_seconds))
+        logger.info(f"Loaded {len(self._slots)} answers into the answer cache from {path}")
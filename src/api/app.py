@@ -1,7 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, status, UploadFile, File
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from typing import List, Optional
 from src.api.auth import (
     create_access_token,
     get_current_user,
@@ -9,21 +14,45 @@ from src.api.auth import (
     get_password_hash,
     get_user,
 )
-from data_model.mongo_db.db import init_db
+from data_model.mongo_db.db import init_db, next_sequence_value
 from data_model.pydantic_models.auth import Token, User, UserCreate
-from data_model.pydantic_models.chat import ChatRequest, ChatResponse, SessionResponse
+from data_model.pydantic_models.chat import ChatRequest, ChatResponse, SessionResponse, SessionSummaryResponse
 from data_model.mongo_db.schemas.user import User as DBUser
 from data_model.mongo_db.schemas.session import Session, Message
 from data_ingestion.web_scraper import URLIngestion
 from data_ingestion.vespa_ingestion import DocumentIngestion
 from data_ingestion.file_processor import FileIngestion
-from core.logger import get_logger
+from core.logger import configure_logging, get_logger
 from core.utils import delete_temporary_files
-from core.settings import ALLOW_ORIGINS
+from core.config import MAX_UPLOAD_SIZE
+from core.settings import ALLOW_ORIGINS, ANSWER_CACHE_PATH
 from src.chatbot import Chatbot
+import orjson
 import uuid
 
-app = FastAPI(title="SDP RAG API")
+configure_logging()
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.mongo_client = await init_db()
+    
+    # Build the chatbot before serving, so the first chat request does not pay for its initialization
+    app.state.chatbot = Chatbot()
+    
+    # The scraper keeps its browser and HTTP connections open between ingestions
+    app.state.url_ingestion = URLIngestion()
+    
+    # Ingestions share the data directory, so one runs from writing its files to deleting them at a time
+    app.state.ingestion_lock = asyncio.Lock()
+    
+    yield
+    
+    app.state.chatbot.answer_cache.save(ANSWER_CACHE_PATH)
+    app.state.url_ingestion.close()
+    app.state.mongo_client.close()
+
+app = FastAPI(title="SDP RAG API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,11 +63,6 @@ app.add_middleware(
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-logger = get_logger(__name__, log_file="ingestion.log")
-
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -69,9 +93,9 @@ async def register_user(user_data: UserCreate):
             detail="Username already registered"
         )
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     db_user = DBUser(
-        user_id=await DBUser.count() + 1,
+        user_id=await next_sequence_value("user_id"),
         email=user_data.email,
         username=user_data.username,
         hashed_password=hashed_password,
@@ -91,13 +115,18 @@ async def root():
     return {"message": "Welcome to SDP RAG API"}
 
 @app.post("/ingest-urls")
-async def ingest_urls(urls: List[str], current_user: DBUser = Depends(get_current_user)):
+async def ingest_urls(
+    urls: List[str],
+    background_tasks: BackgroundTasks,
+    current_user: DBUser = Depends(get_current_user)
+):
     """
     Ingest content from a list of URLs into the Vespa vector database.
     Only users with admin privileges can access this endpoint.
     
     Args:
         urls: List of URLs to scrape and ingest
+        background_tasks: Tasks run after the response has been sent
         current_user: Current authenticated user
         
     Returns:
@@ -112,20 +141,43 @@ async def ingest_urls(urls: List[str], current_user: DBUser = Depends(get_curren
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admin users can ingest URLs"
         )
+    
+    # Reject malformed URLs up front and drop duplicates, so every page is scraped and embedded only once
+    normalized_urls = [URLIngestion.normalize_url(url) for url in urls]
+    invalid_urls = [url for url, normalized_url in zip(urls, normalized_urls) if normalized_url is None]
+    if invalid_urls:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid URLs: {', '.join(invalid_urls)}"
+        )
+    urls = list(dict.fromkeys(normalized_urls))
         
     try:
         # Initialize ingestion classes
-        url_ingestion = URLIngestion()
         doc_ingestion = DocumentIngestion()
         
-        # Process URLs and save to text files
-        url_ingestion.process_urls(urls)
-        
-        # Ingest documents into Vespa
-        doc_ingestion.ingest_documents()
-        
-        # Clean up temporary files
-        delete_temporary_files()
+        async with app.state.ingestion_lock:
+            # Process URLs and save to text files
+            await asyncio.to_thread(app.state.url_ingestion.process_urls, urls)
+            
+            # Ingest documents into Vespa
+            ingested_chunks, failed_files = await doc_ingestion.ingest_documents()
+            app.state.chatbot.context_retrieval.clear_cache()
+            app.state.chatbot.answer_cache.clear()
+            
+            # Clean up temporary files
+            delete_temporary_files()
+            
+            if failed_files:
+                # Background tasks do not run for error responses, so the chunks of the other files are indexed now
+                await asyncio.to_thread(app.state.chatbot.add_ingested_chunks, ingested_chunks)
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Could not ingest {', '.join(os.path.basename(file_path) for file_path in failed_files)}"
+                )
+            
+            # The new chunks are added to the local index after the response has been sent
+            background_tasks.add_task(app.state.chatbot.add_ingested_chunks, ingested_chunks)
         
         return {
             "status": "success",
@@ -133,16 +185,15 @@ async def ingest_urls(urls: List[str], current_user: DBUser = Depends(get_curren
             "processed_urls": urls
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during URL ingestion: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Ensure the webdriver is closed
-        if 'url_ingestion' in locals():
-            url_ingestion.driver.quit()
 
 @app.post("/ingest-file")
 async def ingest_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: DBUser = Depends(get_current_user)
 ):
@@ -151,6 +202,7 @@ async def ingest_file(
     Only users with admin privileges can access this endpoint.
     
     Args:
+        background_tasks: Tasks run after the response has been sent
         file: The uploaded file (PDF or TXT)
         current_user: Current authenticated user
         
@@ -174,28 +226,46 @@ async def ingest_file(
             detail="Only PDF and TXT files are supported"
         )
     
+    # Reject oversized uploads before processing them
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Files larger than {MAX_UPLOAD_SIZE // (1024 * 1024)} MB are not supported"
+        )
+    
     try:
-        # Read file content
-        file_content = await file.read()
-        
         # Initialize ingestion classes
         file_ingestion = FileIngestion()
         doc_ingestion = DocumentIngestion()
         
-        # Process file and extract text
-        text = file_ingestion.process_file(file_content, file.filename)
-        
-        if not text:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not extract text from file"
-            )
-        
-        # Ingest document into Vespa
-        doc_ingestion.ingest_documents()
-        
-        # Clean up temporary files
-        delete_temporary_files()
+        async with app.state.ingestion_lock:
+            # Process file and extract text, reading the upload from its spooled temporary file
+            text = await asyncio.to_thread(file_ingestion.process_file, file.file, file.filename)
+            
+            if not text:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Could not extract text from file"
+                )
+            
+            # Ingest document into Vespa
+            ingested_chunks, failed_files = await doc_ingestion.ingest_documents()
+            app.state.chatbot.context_retrieval.clear_cache()
+            app.state.chatbot.answer_cache.clear()
+            
+            # Clean up temporary files
+            delete_temporary_files()
+            
+            if failed_files:
+                # Background tasks do not run for error responses, so the chunks of the other files are indexed now
+                await asyncio.to_thread(app.state.chatbot.add_ingested_chunks, ingested_chunks)
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Could not ingest {', '.join(os.path.basename(file_path) for file_path in failed_files)}"
+                )
+            
+            # The new chunks are added to the local index after the response has been sent
+            background_tasks.add_task(app.state.chatbot.add_ingested_chunks, ingested_chunks)
         
         return {
             "status": "success",
@@ -203,10 +273,85 @@ async def ingest_file(
             "filename": file.filename
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during file ingestion: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_user_session(session_id: str, current_user: DBUser) -> Session:
+    """
+    Get an existing chat session of the user. Sessions of other users are reported as not found.
+    
+    Args:
+        session_id: ID of the session
+        current_user: Current authenticated user
+        
+    Returns:
+        Session: The chat session
+        
+    Raises:
+        HTTPException: If session not found
+    """
+    # The ownership check is part of the query, so it is enforced by the (session_id, user_id) index
+    session = await Session.find_one(
+        Session.session_id == session_id, Session.user_id == str(current_user.user_id)
+    )
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    return session
+
+async def store_chat_turn(
+    session_id: str,
+    is_new_session: bool,
+    current_user: DBUser,
+    user_message: Message,
+    answer: str
+) -> None:
+    """
+    Store a question and its answer in a chat session, creating the session if needed.
+    
+    Args:
+        session_id: ID of the session
+        is_new_session: Whether the session has to be created
+        current_user: Current authenticated user
+        user_message: The user's question
+        answer: The chatbot's answer
+    """
+    assistant_message = Message(content=answer, role="assistant")
+    
+    if is_new_session:
+        await Session(
+            session_id=session_id,
+            user_id=str(current_user.user_id),
+            messages=[user_message, assistant_message]
+        ).insert()
+    else:
+        # Push both messages in a single update instead of rewriting the whole session
+        await Session.find_one(
+            Session.session_id == session_id, Session.user_id == str(current_user.user_id)
+        ).update({
+            "$push": {"messages": {"$each": [user_message.model_dump(), assistant_message.model_dump()]}},
+            "$set": {"updated_at": assistant_message.timestamp},
+        })
+
+def sse_event(data: dict, event: Optional[str] = None) -> bytes:
+    """
+    Encode a Server-Sent Event. Events are sent for every token of an answer, so they are serialized with orjson.
+    
+    Args:
+        data: JSON payload of the event
+        event: Optional event type
+        
+    Returns:
+        bytes: The encoded event
+    """
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
@@ -226,51 +371,27 @@ async def chat(
         HTTPException: If chat processing fails
     """
     try:
-        if not hasattr(app, 'chatbot'):
-            app.chatbot = Chatbot()
-            
+        user_message = Message(content=request.question, role="user")
+        
         # Use provided session_id or create new session
         session_id = request.session_id
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            session = Session(
-                session_id=session_id,
-                user_id=str(current_user.user_id),
-                messages=[
-                    Message(content=request.question, role="user")
-                ]
-            )
-            await session.insert()
+        if session_id:
+            await get_user_session(session_id, current_user)
         else:
-            # Get existing session
-            session = await Session.find_one(Session.session_id == session_id)
-            if not session:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Session not found"
-                )
-            # Verify session belongs to user
-            if session.user_id != str(current_user.user_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Access denied to this session"
-                )
-            # Append new message
-            session.messages.append(Message(content=request.question, role="user"))
-            await session.save()
+            session_id = str(uuid.uuid4())
         
         # Get answer from chatbot
-        answer = app.chatbot.get_answer(request.question, session_id)
+        answer = await asyncio.to_thread(app.state.chatbot.get_answer, request.question, session_id)
         
-        # Append assistant's response to session
-        session.messages.append(Message(content=answer, role="assistant"))
-        await session.save()
+        await store_chat_turn(session_id, not request.session_id, current_user, user_message, answer)
         
         return ChatResponse(
             answer=answer,
             session_id=session_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Error during chat: {type(e).__name__}: {str(e)}"
         logger.error(error_msg, exc_info=True)
@@ -283,16 +404,71 @@ async def chat(
             }
         )
 
-@app.get("/sessions", response_model=List[SessionResponse])
-async def get_sessions(current_user: DBUser = Depends(get_current_user)):
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user: DBUser = Depends(get_current_user)
+):
+    """
+    Chat with the RAG-powered IBU chatbot, streaming the answer as Server-Sent Events while it is generated.
+    Every event carries a token of the answer as `{"token": ...}`, and a final `end` event carries the session ID.
+    
+    Args:
+        request: Chat request containing the user's question and optional session_id
+        current_user: Current authenticated user
+        
+    Returns:
+        StreamingResponse: Event stream of the chatbot's answer
+        
+    Raises:
+        HTTPException: If session not found
+    """
+    user_message = Message(content=request.question, role="user")
+    
+    # Use provided session_id or create new session
+    session_id = request.session_id
+    if session_id:
+        await get_user_session(session_id, current_user)
+    else:
+        session_id = str(uuid.uuid4())
+    
+    async def event_source():
+        try:
+            tokens = []
+            # The chatbot blocks on the OpenAI API, so its tokens are pulled from a worker thread
+            async for token in iterate_in_threadpool(
+                app.state.chatbot.get_answer_stream(request.question, session_id)
+            ):
+                tokens.append(token)
+                yield sse_event({'token': token})
+            
+            await store_chat_turn(session_id, not request.session_id, current_user, user_message, ''.join(tokens))
+            
+            yield sse_event({'session_id': session_id}, event="end")
+            
+        except Exception as e:
+            error_msg = f"Error during chat: {type(e).__name__}: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            yield sse_event({'error': error_msg}, event="error")
+    
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+@app.get("/sessions", response_model=List[SessionSummaryResponse])
+async def get_sessions(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: DBUser = Depends(get_current_user)
+):
     """
-    Get all chat sessions for the authenticated user.
+    Get the chat sessions of the authenticated user, newest first, without their messages.
     
     Args:
+        skip: Number of sessions to skip, for pagination
+        limit: Maximum number of sessions to return
         current_user: Current authenticated user
         
     Returns:
-        List[SessionResponse]: List of all sessions with their messages
+        List[SessionSummaryResponse]: Page of sessions
         
     Raises:
         HTTPException: If session retrieval fails
@@ -300,7 +476,7 @@ async def get_sessions(current_user: DBUser = Depends(get_current_user)):
     try:
         sessions = await Session.find(
             Session.user_id == str(current_user.user_id)
-        ).sort(-Session.created_at).to_list()
+        ).sort(-Session.created_at).skip(skip).limit(limit).project(SessionSummaryResponse).to_list()
         
         return sessions
         
@@ -316,6 +492,41 @@ async def get_sessions(current_user: DBUser = Depends(get_current_user)):
             }
         )
 
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(
+    session_id: str,
+    current_user: DBUser = Depends(get_current_user)
+):
+    """
+    Get a specific chat session with its messages.
+    
+    Args:
+        session_id: ID of the session
+        current_user: Current authenticated user
+        
+    Returns:
+        SessionResponse: The session with its messages
+        
+    Raises:
+        HTTPException: If session not found or session retrieval fails
+    """
+    try:
+        return await get_user_session(session_id, current_user)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error retrieving session: {type(e).__name__}: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": error_msg,
+                "type": type(e).__name__,
+                "message": str(e) if str(e) else "Unknown error occurred"
+            }
+        )
+
 @app.delete("/sessions/{session_id}")
 async def delete_session(
     session_id: str,
@@ -332,26 +543,18 @@ async def delete_session(
         dict: Success message
         
     Raises:
-        HTTPException: If session not found or user not authorized
+        HTTPException: If session not found
     """
     try:
-        # Find the session
-        session = await Session.find_one(Session.session_id == session_id)
-        if not session:
+        # Delete the session only if it belongs to the user, in a single query
+        result = await Session.find_one(
+            Session.session_id == session_id, Session.user_id == str(current_user.user_id)
+        ).delete()
+        if not result or result.deleted_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Session not found"
             )
-            
-        # Verify session belongs to user
-        if session.user_id != str(current_user.user_id):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to this session"
-            )
-            
-        # Delete the session
-        await session.delete()
         
         return {
             "status": "success",
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
@@ -28,7 +29,8 @@ async def authenticate_user(username: str, password: str):
     user = await get_user(username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt is deliberately slow, so it runs on a worker thread instead of blocking the event loop
+    if not await asyncio.to_thread(verify_password, password, user.hashed_password):
         return False
     return user
 
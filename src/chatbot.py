@@ -1,11 +1,20 @@
 from src.context_retrieval import ContextRetrieval
 from src.conversation_session import ConversationSession
-from core.config import GPT_MODEL, NUM_OF_CONTEXT_CHUNKS
+from src.answer_cache import AnswerCache
+from core.config import (
+    GPT_MODEL,
+    NUM_OF_CONTEXT_CHUNKS,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from core.settings import ANSWER_CACHE_PATH
 from openai import OpenAI
-from typing import List, Dict
+from typing import Iterator, List, Dict, Tuple
+import numpy as np
 from core.logger import get_logger
 
-logger = get_logger(__name__, log_file="chatbot.log")
+logger = get_logger(__name__)
 
 class Chatbot:
     def __init__(self):
@@ -17,6 +26,12 @@ class Chatbot:
             self.context_retrieval = ContextRetrieval()
             self.openai_client = OpenAI()
             self.sessions = {}
+            self.answer_cache = AnswerCache(
+                max_entries=ANSWER_CACHE_SIZE,
+                similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            )
+            self.answer_cache.load(ANSWER_CACHE_PATH)
             logger.info("Chatbot initialized successfully.")
         except Exception as e:
             logger.exception("Failed to initialize Chatbot.")
@@ -44,17 +59,17 @@ class Chatbot:
             # Merge the context chunks into a single string separated by newlines
             context_chunks = [chunk["fields"]["chunk_text"] for chunk in context]
             merged_context_chunks = '\n\n'.join(context_chunks)
-            logger.debug(f"Merged context chunks: {merged_context_chunks}")
+            logger.debug("Merged context chunks: %s", merged_context_chunks)
 
             # Add the last question to conversation history
             conversation_history.append({"role": "user", "content": question})
-            logger.debug(f"Updated conversation history: {conversation_history}")
+            logger.debug("Updated conversation history: %s", conversation_history)
 
             # Merge the conversation history into a single string
             conversation_history_text = '\n'.join([
                 f'{message["role"]}: {message["content"]}' for message in conversation_history
             ])
-            logger.debug(f"Merged conversation history: {conversation_history_text}")
+            logger.debug("Merged conversation history: %s", conversation_history_text)
 
             messages = [
                 {
@@ -91,6 +106,18 @@ class Chatbot:
 
         :return: The answer to the question.
         """
+        return ''.join(self.get_answer_stream(question, session_id))
+
+    def get_answer_stream(self, question: str, session_id: str) -> Iterator[str]:
+        """
+        Get the answer to a question, using the context retrieval system, as it is being generated by the ChatGPT API.
+        The session is updated with the full answer once the last token has been yielded.
+
+        :param question: The question to be answered.
+        :param session_id: The session ID of the user to retrieve the chat history.
+
+        :return: Iterator over the tokens of the answer.
+        """
         try:
             logger.info(f"Received question: '{question}' for session_id: {session_id}")
 
@@ -99,32 +126,57 @@ class Chatbot:
                 logger.info(f"Creating new session for session_id: {session_id}")
                 self.sessions[session_id] = ConversationSession(session_id)
 
+            conversation_history = self.sessions[session_id].conversation_history()
+
+            # The first question of a session does not depend on any history, so its answer can be cached
+            question_embedding = None
+            if not conversation_history:
+                question_embedding = self.context_retrieval.query_embedder.embed(question)
+                answer = self.answer_cache.get(question, question_embedding)
+                if answer is not None:
+                    conversation_history.append({"role": "user", "content": question})
+                    self.sessions[session_id].update_session(answer)
+                    yield answer
+                    return
+
             # Rephrase the question
             rephrased_question = self.rephrase_question(question, session_id)
             logger.debug(f"Rephrased question: '{rephrased_question}'")
 
             # Retrieve context chunks
             logger.info(f"Retrieving context for rephrased question: '{rephrased_question}'")
-            context = ContextRetrieval().semantic_search(
-                collection_name='chunks', query=rephrased_question, hits=NUM_OF_CONTEXT_CHUNKS
+            # The embedding computed for the answer cache is reused if rephrasing left the question unchanged
+            context = self.context_retrieval.semantic_search(
+                collection_name='chunks',
+                query=rephrased_question,
+                hits=NUM_OF_CONTEXT_CHUNKS,
+                embedding=question_embedding if rephrased_question == question.strip() else None,
             )
             logger.debug(f"Retrieved {len(context)} context chunks.")
 
             # Construct a prompt with conversation history and context
-            prompt = self.create_prompt(question, context, self.sessions[session_id].conversation_history())
+            prompt = self.create_prompt(question, context, conversation_history)
             logger.info("Prompt created successfully.")
 
-            # Get the answer from the ChatGPT API
+            # Stream the answer from the ChatGPT API
             logger.info("Sending prompt to ChatGPT API.")
-            response = self.openai_client.chat.completions.create(model=GPT_MODEL, messages=prompt)
-            answer = response.choices[0].message.content
+            stream = self.openai_client.chat.completions.create(model=GPT_MODEL, messages=prompt, stream=True)
+
+            tokens = []
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    tokens.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+            answer = ''.join(tokens)
             logger.info("Received response from ChatGPT API.")
 
+            if question_embedding is not None:
+                self.answer_cache.put(question, question_embedding, answer)
+
             # Update the session with the new answer
             self.sessions[session_id].update_session(answer)
             logger.info(f"Updated session history for session_id: {session_id}")
-
-            return answer
         except Exception as e:
             logger.exception(f"Error in get_answer for session_id: {session_id}: {str(e)}")
             raise e
@@ -145,13 +197,13 @@ class Chatbot:
 
             # Retrieve the conversation history for the session
             conversation_history = self.sessions[session_id].conversation_history()
-            logger.debug(f"Conversation history for session_id {session_id}: {conversation_history}")
+            logger.debug("Conversation history for session_id %s: %s", session_id, conversation_history)
 
             # Merge the conversation history into a single string
             conversation_history_text = '\n'.join([
                 f'{message["role"]}: {message["content"]}' for message in conversation_history
             ])
-            logger.debug(f"Merged conversation history: {conversation_history_text}")
+            logger.debug("Merged conversation history: %s", conversation_history_text)
 
             # Prepare the prompt for the OpenAI API
             prompt = [
@@ -192,6 +244,16 @@ class Chatbot:
             logger.exception(f"Error in rephrasing question for session_id {session_id}: {str(e)}")
             raise e
 
+    def add_ingested_chunks(self, chunks: List[Tuple[Dict, np.ndarray]]):
+        """
+        Make newly ingested chunks available to answers by adding them to the local chunk index, then drop cached
+        answers that were given without them.
+
+        :param chunks: (chunk document, embedding) tuples returned by the document ingestion.
+        """
+        self.context_retrieval.add_to_local_index(chunks)
+        self.answer_cache.clear()
+
     def remove_session(self, session_id: str):
         """
         Remove a session from the chatbot.
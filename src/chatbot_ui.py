@@ -1,22 +1,27 @@
 import os
 import streamlit as st
-import random
-import time
 import hmac
+import threading
 from dotenv import load_dotenv
 from src.chatbot import Chatbot
-import string
+from core.logger import configure_logging
+import uuid
 
 load_dotenv()
+configure_logging()
 
 STREAMLIT_PASSWORD = os.getenv("STREAMLIT_PASSWORD")
 
 
-def generate_random_string(length=8):
-    """Generate a random string of letters and digits."""
-    characters = string.ascii_letters + string.digits
-    random_string = ''.join(random.choice(characters) for _ in range(length))
-    return random_string
+@st.cache_resource
+def get_chatbot():
+    """Create the chatbot once per server process, so all browser sessions share its index, caches and threads."""
+    return Chatbot()
+
+
+def generate_session_id():
+    """Generate a random session id, in the same format as the API's session ids."""
+    return str(uuid.uuid4())
 
 
 def check_password():
@@ -47,27 +52,26 @@ if not check_password():
     st.stop()  # Do not continue if check_password is not True.
 
 
-# Streamed response emulator
 def response_generator(prompt):
+    session_id = st.session_state.session_id
 
-    answer = st.session_state.chatbot.get_answer(prompt, st.session_state.session_id)
-    store_to_txt()
+    yield from st.session_state.chatbot.get_answer_stream(prompt, session_id)
 
-    for word in answer.split():
-        yield word + " "
-        time.sleep(0.05)
+    # Append the new question and answer to the transcript once the answer is complete, without making the UI wait
+    # for the disk
+    new_messages = st.session_state.chatbot.sessions[session_id].conversation_history()[-2:]
+    threading.Thread(target=store_to_txt, args=(session_id, new_messages)).start()
 
 
-def store_to_txt():
-    history = st.session_state.chatbot.sessions[st.session_state.session_id].conversation_history()
+def store_to_txt(session_id, messages):
 
-    # Merge the conversation history into a single string
-    conversation_history_text = '\n\n'.join([
-        f'{message["role"]}: {message["content"]}' for message in history
+    # Only the latest turn is written, so the cost per turn does not grow with the conversation
+    turn_text = ''.join([
+        f'{message["role"]}: {message["content"]}\n\n' for message in messages
     ])
 
-    with open(st.session_state.session_id + '.txt', 'w') as file:
-        file.write(conversation_history_text)
+    with open(session_id + '.txt', 'a') as file:
+        file.write(turn_text)
 
 
 st.title("IBU AI Assistant")
@@ -75,8 +79,8 @@ st.title("IBU AI Assistant")
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
-    st.session_state.chatbot = Chatbot()
-    st.session_state.session_id = generate_random_string()
+    st.session_state.chatbot = get_chatbot()
+    st.session_state.session_id = generate_session_id()
 
 # Display chat messages from history on app rerun
 for message in st.session_state.messages:
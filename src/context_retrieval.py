@@ -1,11 +1,29 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 from data_model.vespa_ai.vespa_client import VespaClient
 from data_ingestion.text_embedder import Embedder
+from src.embedding_batcher import EmbeddingBatcher
+from src.local_index import LocalChunkIndex
 from dotenv import load_dotenv
-from typing import List, Dict
-from core.settings import VESPA_HOST, VESPA_PORT
+from typing import List, Dict, Optional, Tuple
+from core.config import (
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    QUERY_EMBEDDING_BATCH_SIZE,
+    QUERY_EMBEDDING_BATCH_WAIT_SECONDS,
+    LOCAL_INDEX_HNSW_M,
+    LOCAL_INDEX_EF_SEARCH,
+)
+from core.settings import VESPA_HOST, VESPA_PORT, LOCAL_INDEX_PATH
+from core.logger import get_logger
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 class ContextRetrieval:
 
@@ -13,6 +31,33 @@ class ContextRetrieval:
         self.vespa_client = VespaClient(vespa_host=VESPA_HOST, vespa_port=VESPA_PORT)
         self.embedder = Embedder()
 
+        # Questions asked concurrently are embedded together in a single OpenAI API call. Their embeddings are only
+        # cached in memory, the on-disk cache is kept for ingested documents
+        self.query_embedder = EmbeddingBatcher(
+            self.embedder,
+            max_batch_size=QUERY_EMBEDDING_BATCH_SIZE,
+            max_wait_seconds=QUERY_EMBEDDING_BATCH_WAIT_SECONDS,
+            persist=False,
+        )
+
+        # Chunk embeddings are searched in-process, falling back to Vespa if they could not be loaded
+        self.local_index = LocalChunkIndex(
+            self.vespa_client, LOCAL_INDEX_PATH, hnsw_m=LOCAL_INDEX_HNSW_M, ef_search=LOCAL_INDEX_EF_SEARCH
+        )
+        try:
+            index_loaded = self.local_index.load()
+        except Exception as e:
+            logger.warning(f"Could not load local chunk index: {str(e)}")
+            index_loaded = False
+
+        if not index_loaded:
+            # Vespa is searched until the index has been built in the background
+            threading.Thread(target=self._build_local_index, daemon=True).start()
+
+        # Results of recent queries keyed by a hash of the query, as (expiry time, records)
+        self._search_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+
     def semantic_search(
             self,
             collection_name: str,
@@ -20,7 +65,8 @@ class ContextRetrieval:
             ranking: str = 'embedding_query',
             hits: int = 50,
             target_hits: int = 50,
-            restrictions: dict = None
+            restrictions: dict = None,
+            embedding: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """
         Build query for embedding fields and retrieve results
@@ -31,18 +77,35 @@ class ContextRetrieval:
         :param hits: Number of records that will be returned.
         :param target_hits: Wanted number of hits exposed to the real first-phase ranking function per content node.
         :param restrictions: Dictionary with additional filtering conditions.
+        :param embedding: Embedding of the query, if the caller has already computed it.
 
         :return: Records that matches the query.
         """
 
-        embedding = self.embedder.openai_embedding(text=query)
+        # Frequently asked questions repeat, so their results are served without embedding the query or calling Vespa
+        cache_key = hashlib.blake2b(
+            repr((collection_name, ' '.join(query.lower().split()), ranking, hits, target_hits, restrictions)).encode(),
+            digest_size=16,
+        ).hexdigest()
+        records = self._cached_search(cache_key)
+        if records is not None:
+            return records
+
+        if embedding is None:
+            embedding = self.query_embedder.embed(query)
+
+        if collection_name == 'chunks' and ranking == 'embedding_query' and restrictions is None \
+                and self.local_index.ready:
+            records = self.local_index.search(embedding, hits=hits, target_hits=target_hits)
+            self._cache_search(cache_key, records)
+            return records
 
         query = {
             "hits": hits,
             "yql": f"select * from {collection_name} where "
                    f"({{targetHits: {target_hits}}}nearestNeighbor(embedding, query_embedding))",
 
-            "ranking.features.query(query_embedding)": embedding,
+            "ranking.features.query(query_embedding)": embedding.tolist(),
             "ranking": ranking
         }
 
@@ -50,4 +113,74 @@ class ContextRetrieval:
             for k in restrictions:
                 query['yql'] += f" and {k} contains '{restrictions[k]}'"
 
-        return self.vespa_client.query(query_body=query)
\ No newline at end of file
+        records = self.vespa_client.query(query_body=query)
+        self._cache_search(cache_key, records)
+
+        return records
+
+    def add_to_local_index(self, chunks: List[Tuple[Dict, np.ndarray]]):
+        """
+        Add newly ingested chunks to the local chunk index, then drop all cached query results. If the index is not
+        available yet, it is built from Vespa instead, which includes the new chunks.
+
+        :param chunks: (chunk document, embedding) tuples returned by the document ingestion.
+        """
+        if self.local_index.ready:
+            try:
+                self.local_index.add(chunks)
+            except Exception as e:
+                logger.error(f"Error adding chunks to local chunk index: {str(e)}")
+        else:
+            self._build_local_index()
+
+        self.clear_cache()
+
+    def _build_local_index(self):
+        """
+        Build the local chunk index from Vespa, logging instead of raising errors.
+        """
+        try:
+            self.local_index.build()
+        except Exception as e:
+            logger.error(f"Error building local chunk index: {str(e)}")
+
+    def clear_cache(self):
+        """
+        Drop all cached query results, e.g. after new documents have been ingested.
+        """
+        with self._search_cache_lock:
+            self._search_cache.clear()
+
+    def _cached_search(self, cache_key: str) -> Optional[List[Dict]]:
+        """
+        Get the cached results of a query, if they have not expired yet.
+
+        :param cache_key: Hash of the query.
+
+        :return: Cached records, or None if the query is not cached.
+        """
+        with self._search_cache_lock:
+            cached = self._search_cache.get(cache_key)
+            if cached is None:
+                return None
+
+            expires_at, records = cached
+            if expires_at < time.monotonic():
+                del self._search_cache[cache_key]
+                return None
+
+            self._search_cache.move_to_end(cache_key)
+            return records
+
+    def _cache_search(self, cache_key: str, records: List[Dict]):
+        """
+        Cache the results of a query, evicting the least recently used ones above RETRIEVAL_CACHE_SIZE.
+
+        :param cache_key: Hash of the query.
+        :param records: Records that match the query.
+        """
+        with self._search_cache_lock:
+            self._search_cache[cache_key] = (time.monotonic() + RETRIEVAL_CACHE_TTL_SECONDS, records)
+            self._search_cache.move_to_end(cache_key)
+            while len(self._search_cache) > RETRIEVAL_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
\ No newline at end of file
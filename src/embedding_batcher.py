@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+from data_ingestion.text_embedder import Embedder
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingBatcher:
+
+    def __init__(self, embedder: Embedder, max_batch_size: int, max_wait_seconds: float, persist: bool = True):
+        """
+        Coalesce embedding requests made concurrently by different threads into a single OpenAI API call. A background
+        thread collects the texts that arrive within `max_wait_seconds` of the first one, up to `max_batch_size`, and
+        embeds them together.
+
+        :param embedder: Embedder used to embed the batched texts.
+        :param max_batch_size: Maximum number of texts embedded in one call.
+        :param max_wait_seconds: Maximum time the first text of a batch waits for others to join it.
+        :param persist: Whether the embedder uses its on-disk cache for the batched texts.
+        """
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.persist = persist
+
+        self._queue: "queue.SimpleQueue[Tuple[str, Future]]" = queue.SimpleQueue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Get the embedding of a text, waiting until the batch it was added to has been embedded.
+
+        :param text: Text to be embedded.
+
+        :return: Float32 array representing the embedding of the text.
+        """
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        """
+        Wait for a text to embed, then collect the texts that arrive shortly after it.
+
+        :return: List of (text, future) tuples.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_seconds
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """
+        Embed batches of texts until the process exits.
+        """
+        while True:
+            batch = self._next_batch()
+            logger.debug(f"Embedding a batch of {len(batch)} texts")
+
+            try:
+                embeddings = self.embedder.openai_embedding_batch([text for text, _ in batch], persist=self.persist)
+            except Exception as e:
+                logger.error(f"Error embedding a batch of {len(batch)} texts: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
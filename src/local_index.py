@@ -0,0 +1,206 @@
+import os
+import pickle
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from data_model.vespa_ai.vespa_client import VespaClient
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Chunk fields kept in memory and returned with every hit
+RECORD_FIELDS = ['chunk_id', 'resource_id', 'chunk_text', 'metadata']
+
+
+class LocalChunkIndex:
+
+    def __init__(self, vespa_client: VespaClient, index_path: str, hnsw_m: int, ef_search: int):
+        """
+        In-process copy of the chunk embeddings stored in Vespa, searched with a FAISS HNSW index over 8-bit scalar
+        quantized vectors. Vespa stays the authoritative store, but questions are answered without a network round
+        trip to it.
+
+        :param vespa_client: Client used to load the chunks from Vespa.
+        :param index_path: Path of the FAISS index file. The chunk records are stored next to it.
+        :param hnsw_m: Number of neighbors of every node in the HNSW graph.
+        :param ef_search: Minimum number of candidates explored during a search.
+        """
+        self.vespa_client = vespa_client
+        self.index_path = index_path
+        self.records_path = os.path.splitext(index_path)[0] + '.pkl'
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+        # The index and its records are swapped together, so searches never see a half-built index
+        self._state: Optional[Tuple[faiss.Index, List[Dict]]] = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """
+        :return: Whether the index has been loaded or built.
+        """
+        return self._state is not None
+
+    def load(self) -> bool:
+        """
+        Load the index persisted by a previous `build` or `add`, if it still holds as many chunks as Vespa. Another
+        process may have ingested documents since the index was persisted.
+
+        :return: Whether an up-to-date index was found on disk.
+        """
+        if not (os.path.exists(self.index_path) and os.path.exists(self.records_path)):
+            return False
+
+        index = faiss.read_index(self.index_path)
+        with open(self.records_path, 'rb') as file:
+            records = pickle.load(file)
+
+        # Another process may have replaced one of the files between the two reads
+        if index.ntotal != len(records):
+            logger.info(
+                f"Local chunk index at {self.index_path} holds {index.ntotal} vectors for {len(records)} chunks, "
+                f"it has to be rebuilt"
+            )
+            return False
+
+        chunk_count = self.vespa_client.count('chunks')
+        if chunk_count != len(records):
+            logger.info(
+                f"Local chunk index at {self.index_path} holds {len(records)} chunks but Vespa holds {chunk_count}, "
+                f"it has to be rebuilt"
+            )
+            return False
+
+        self._state = (index, records)
+        logger.info(f"Loaded local chunk index with {len(records)} chunks from {self.index_path}")
+        return True
+
+    def build(self):
+        """
+        Load all chunks and their embeddings from Vespa, index them and persist the index to disk.
+        """
+        with self._build_lock:
+            logger.info("Building local chunk index from Vespa.")
+
+            records = []
+            embeddings = []
+            for document in self.vespa_client.visit('chunks', fields=RECORD_FIELDS + ['embedding']):
+                fields = document.get("fields", {})
+                embedding = fields.pop('embedding', None)
+                if embedding is None:
+                    continue
+
+                # Dense tensors are returned as plain lists, older Vespa versions wrap them in a "values" object
+                if isinstance(embedding, dict):
+                    embedding = embedding["values"]
+
+                records.append({"id": document["id"], "fields": fields})
+                embeddings.append(np.asarray(embedding, dtype=np.float32))
+
+            if not records:
+                logger.warning("No chunks found in Vespa, local chunk index was not built.")
+                return
+
+            # Vectors are stored with 8 bits per dimension, a quarter of the memory of float32
+            index = faiss.IndexHNSWSQ(
+                embeddings[0].shape[0], faiss.ScalarQuantizer.QT_8bit, self.hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            matrix = self._normalized(embeddings)
+            index.train(matrix)
+            index.add(matrix)
+
+            self._save(index, records)
+            logger.info(f"Built local chunk index with {len(records)} chunks.")
+
+    def add(self, chunks: List[Tuple[Dict, np.ndarray]]):
+        """
+        Add newly fed chunks to a ready index and persist it, without reading the rest of the corpus from Vespa.
+        Chunks that are already indexed are skipped.
+
+        :param chunks: (chunk document, embedding) tuples, with documents in the format fed to Vespa.
+        """
+        with self._build_lock:
+            index, records = self._state
+            indexed_chunk_ids = {record["fields"]["chunk_id"] for record in records}
+
+            new_records = []
+            new_embeddings = []
+            for document, embedding in chunks:
+                fields = {field: document["fields"][field] for field in RECORD_FIELDS}
+                if fields["chunk_id"] in indexed_chunk_ids:
+                    continue
+
+                indexed_chunk_ids.add(fields["chunk_id"])
+                new_records.append({"id": f"id:chunks:chunks::{fields['chunk_id']}", "fields": fields})
+                new_embeddings.append(np.asarray(embedding, dtype=np.float32))
+
+            if not new_records:
+                return
+
+            # Searches keep using the current index while the new chunks are added to a copy of it
+            index = faiss.clone_index(index)
+            index.add(self._normalized(new_embeddings))
+
+            self._save(index, records + new_records)
+            logger.info(f"Added {len(new_records)} chunks to local chunk index.")
+
+    def search(self, embedding: np.ndarray, hits: int, target_hits: int) -> List[Dict]:
+        """
+        Find the chunks most similar to an embedding.
+
+        :param embedding: Embedding of the query.
+        :param hits: Number of records that will be returned.
+        :param target_hits: Number of candidates explored in the HNSW graph, if larger than `ef_search`.
+
+        :return: Records in the same format as Vespa query hits, with the cosine similarity as relevance.
+        """
+        index, records = self._state
+
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1).copy()
+        faiss.normalize_L2(query)
+
+        parameters = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, target_hits))
+        scores, ids = index.search(query, hits, params=parameters)
+
+        return [
+            {"id": records[i]["id"], "relevance": float(score), "fields": records[i]["fields"]}
+            for score, i in zip(scores[0], ids[0]) if i != -1
+        ]
+
+    @staticmethod
+    def _normalized(embeddings: List[np.ndarray]) -> np.ndarray:
+        """
+        Stack embeddings into a matrix of unit vectors, which makes inner product equal to the cosine similarity used
+        by Vespa's ranking.
+
+        :param embeddings: Embeddings to stack.
+
+        :return: Float32 matrix with one normalized embedding per row.
+        """
+        matrix = np.vstack(embeddings).astype(np.float32)
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def _save(self, index: faiss.Index, records: List[Dict]):
+        """
+        Persist the index and its records to disk, then make them the ones searched.
+
+        :param index: FAISS index.
+        :param records: Chunk records, in the order of the index.
+        """
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+
+        # Files are written under temporary names and renamed, so other processes never read a partially written file
+        index_tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        records_tmp_path = f"{self.records_path}.{os.getpid()}.tmp"
+        faiss.write_index(index, index_tmp_path)
+        with open(records_tmp_path, 'wb') as file:
+            pickle.dump(records, file)
+        os.replace(records_tmp_path, self.records_path)
+        os.replace(index_tmp_path, self.index_path)
+
+        self._state = (index, records)